@@ -3,22 +3,29 @@ FastAPI REST API for Vehicle Damage Detection
 Provides programmatic access to damage detection functionality
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from PIL import Image
-from io import BytesIO
-from typing import List, Optional
+from fastapi.responses import ORJSONResponse
+from typing import List, Dict, Optional
 from datetime import datetime
-import base64
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
 
-from detector import DamageDetector
+from detector import (
+    DamageDetector,
+    DecodedImage,
+    get_detector,
+    encode_jpeg_base64,
+    encode_webp_base64
+)
 from config import (
-    ROBOFLOW_API_KEY, 
     ROBOFLOW_MODEL_ID, 
     APP_TITLE, 
     APP_DESCRIPTION, 
-    VERSION
+    VERSION,
+    MAX_UPLOAD_BYTES
 )
 
 # Initialize FastAPI
@@ -27,7 +34,8 @@ app = FastAPI(
     description=APP_DESCRIPTION,
     version=VERSION,
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # Enable CORS
@@ -39,11 +47,107 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize detector
-detector = DamageDetector(
-    api_key=ROBOFLOW_API_KEY,
-    model_id=ROBOFLOW_MODEL_ID
-)
+# Annotated image output formats: ?format= value -> MIME type
+OUTPUT_FORMATS = {
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp'
+}
+
+# Upload read granularity
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Static payloads for the class/cost endpoints, built once per process
+_CLASSES_PAYLOAD = {
+    "total_classes": len(DamageDetector.DAMAGE_CLASSES),
+    "classes": DamageDetector.DAMAGE_CLASSES,
+    "categories": {
+        "dents": [c for c in DamageDetector.DAMAGE_CLASSES if 'dent' in c.lower()],
+        "scratches": [c for c in DamageDetector.DAMAGE_CLASSES if 'scratch' in c.lower()],
+        "paint": [c for c in DamageDetector.DAMAGE_CLASSES if 'paint' in c.lower()],
+        "glass_lights": [c for c in DamageDetector.DAMAGE_CLASSES 
+                       if any(x in c.lower() for x in ['windscreen', 'light', 'mirror'])]
+    }
+}
+
+_COSTS_PAYLOAD = {
+    "currency": "USD",
+    "costs": DamageDetector.REPAIR_COSTS
+}
+
+# Thread pool for CPU-bound image work (decode, draw, encode) so it does
+# not stall the event loop
+_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+
+async def _read_upload(file: UploadFile) -> bytes:
+    """
+    Read an upload in chunks, rejecting it once it exceeds MAX_UPLOAD_BYTES
+    
+    Raises:
+        HTTPException: 413 if the upload is too large
+    """
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"Image exceeds maximum upload size of {MAX_UPLOAD_BYTES} bytes"
+    )
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise too_large
+    
+    chunks = []
+    total = 0
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        total += len(chunk)
+        if total > MAX_UPLOAD_BYTES:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _load_image(contents: bytes) -> DecodedImage:
+    """
+    Decode an upload once and prepare the JPEG bytes sent for inference
+    
+    JPEG uploads (recognized by their magic bytes, whatever content type the
+    client declared) are forwarded as-is; other formats are re-encoded. The
+    cache digest and base64 body are computed here too, so that
+    detect_damages_async() never hashes or encodes on the event loop.
+    """
+    return DecodedImage.from_bytes(contents)
+
+
+def _annotate(image: DecodedImage, detections: List[Dict],
+              uniform_color: Optional[str] = None,
+              output_format: str = 'jpeg') -> str:
+    """
+    Draw detections on image and return it as base64 in output_format
+    
+    Boxes are colored by severity unless uniform_color is given. The image
+    is drawn on in place: each request owns its decoded image and does not
+    reuse the pixels afterwards.
+    """
+    detector = get_detector()
+    if uniform_color is None:
+        annotated = detector.draw_detections(image, detections, in_place=True)
+    else:
+        annotated = detector.draw_detections_uniform(
+            image, detections, uniform_color, in_place=True
+        )
+    
+    if output_format == 'webp':
+        return encode_webp_base64(annotated, quality=80)
+    return encode_jpeg_base64(annotated, quality=82, progressive=True)
+
+
+@app.on_event("startup")
+async def startup():
+    """Create the detector and open the pooled Roboflow HTTP client"""
+    get_detector().start_http_client()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Close pooled Roboflow connections"""
+    await get_detector().close_http_client()
 
 
 @app.get("/")
@@ -73,37 +177,42 @@ async def health_check():
 
 
 @app.post("/api/detect")
-async def detect_damage(file: UploadFile = File(...)):
+async def detect_damage(
+    file: UploadFile = File(...),
+    output_format: str = Query("jpeg", alias="format", pattern="^(jpeg|webp)$")
+):
     """
     Detect damages in a single vehicle image
     
     Args:
         file: Image file (JPEG, PNG)
+        output_format: Annotated image encoding, "jpeg" or "webp"
         
     Returns:
         JSON with detected damages, costs, and annotated image
     """
     try:
-        # Read and validate image
-        contents = await file.read()
-        image = Image.open(BytesIO(contents))
+        detector = get_detector()
+        loop = asyncio.get_running_loop()
         
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        # Read and validate image
+        contents = await _read_upload(file)
+        image = await loop.run_in_executor(_pool, _load_image, contents)
         
         # Detect damages
-        detections = detector.detect_damages(image)
-        
-        # Calculate total cost
-        total_cost = sum(d['estimated_cost'] for d in detections)
+        detections = await detector.detect_damages_async(image)
         
-        # Generate annotated image
-        annotated_img = detector.draw_detections(image, detections)
+        # Calculate total cost and severity counts in one pass
+        total_cost = 0
+        sev = Counter()
+        for d in detections:
+            total_cost += d['estimated_cost']
+            sev[d['severity']] += 1
         
-        # Convert annotated image to base64
-        img_buffer = BytesIO()
-        annotated_img.save(img_buffer, format='JPEG')
-        img_base64 = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
+        # Generate annotated image as base64
+        img_base64 = await loop.run_in_executor(
+            _pool, _annotate, image, detections, None, output_format
+        )
         
         # Format response
         response = {
@@ -118,9 +227,9 @@ async def detect_damage(file: UploadFile = File(...)):
                 "total_damages": len(detections),
                 "total_estimated_cost": total_cost,
                 "severity_breakdown": {
-                    "minor": sum(1 for d in detections if d['severity'] == 'minor'),
-                    "moderate": sum(1 for d in detections if d['severity'] == 'moderate'),
-                    "severe": sum(1 for d in detections if d['severity'] == 'severe')
+                    "minor": sev['minor'],
+                    "moderate": sev['moderate'],
+                    "severe": sev['severe']
                 }
             },
             "detections": [
@@ -138,11 +247,13 @@ async def detect_damage(file: UploadFile = File(...)):
                 }
                 for d in detections
             ],
-            "annotated_image": f"data:image/jpeg;base64,{img_base64}"
+            "annotated_image": {"mime": OUTPUT_FORMATS[output_format], "data_b64": img_base64}
         }
         
-        return JSONResponse(content=response)
+        return ORJSONResponse(response)
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -153,7 +264,8 @@ async def detect_damage(file: UploadFile = File(...)):
 @app.post("/api/compare")
 async def compare_images(
     pickup_image: UploadFile = File(...),
-    return_image: UploadFile = File(...)
+    return_image: UploadFile = File(...),
+    output_format: str = Query("jpeg", alias="format", pattern="^(jpeg|webp)$")
 ):
     """
     Compare pickup and return images to identify new damages
@@ -161,41 +273,44 @@ async def compare_images(
     Args:
         pickup_image: Vehicle image at pickup
         return_image: Vehicle image at return
+        output_format: Annotated image encoding, "jpeg" or "webp"
         
     Returns:
         JSON with comparison results and new damages
     """
     try:
-        # Read images
-        pickup_contents = await pickup_image.read()
-        return_contents = await return_image.read()
-        
-        pickup_img = Image.open(BytesIO(pickup_contents)).convert('RGB')
-        return_img = Image.open(BytesIO(return_contents)).convert('RGB')
-        
-        # Compare images
-        comparison = detector.compare_images(pickup_img, return_img)
+        detector = get_detector()
+        loop = asyncio.get_running_loop()
         
-        # Generate annotated comparison
-        pickup_annotated = detector.draw_detections(
-            pickup_img, 
-            comparison['pickup_damages'],
-            {'minor': 'green', 'moderate': 'green', 'severe': 'green'}
+        # Read images
+        pickup_contents, return_contents = await asyncio.gather(
+            _read_upload(pickup_image),
+            _read_upload(return_image)
         )
         
-        return_annotated = detector.draw_detections(
-            return_img,
-            comparison['new_damages']
+        pickup_img, return_img = await asyncio.gather(
+            loop.run_in_executor(_pool, _load_image, pickup_contents),
+            loop.run_in_executor(_pool, _load_image, return_contents)
         )
         
-        # Convert to base64
-        pickup_buffer = BytesIO()
-        return_buffer = BytesIO()
-        pickup_annotated.save(pickup_buffer, format='JPEG')
-        return_annotated.save(return_buffer, format='JPEG')
+        # Detect both images concurrently, then compare
+        pickup_task = asyncio.create_task(detector.detect_damages_async(pickup_img))
+        return_task = asyncio.create_task(detector.detect_damages_async(return_img))
+        pickup_damages, return_damages = await asyncio.gather(pickup_task, return_task)
+        
+        comparison = detector.compare_detections(pickup_damages, return_damages)
         
-        pickup_base64 = base64.b64encode(pickup_buffer.getvalue()).decode('utf-8')
-        return_base64 = base64.b64encode(return_buffer.getvalue()).decode('utf-8')
+        # Generate annotated comparison as base64
+        pickup_base64, return_base64 = await asyncio.gather(
+            loop.run_in_executor(
+                _pool, _annotate, pickup_img, comparison['pickup_damages'],
+                'green', output_format
+            ),
+            loop.run_in_executor(
+                _pool, _annotate, return_img, comparison['new_damages'],
+                None, output_format
+            )
+        )
         
         response = {
             "success": True,
@@ -221,13 +336,15 @@ async def compare_images(
                 }
                 for d in comparison['new_damages']
             ],
-            "pickup_annotated": f"data:image/jpeg;base64,{pickup_base64}",
-            "return_annotated": f"data:image/jpeg;base64,{return_base64}",
+            "pickup_annotated": {"mime": OUTPUT_FORMATS[output_format], "data_b64": pickup_base64},
+            "return_annotated": {"mime": OUTPUT_FORMATS[output_format], "data_b64": return_base64},
             "message": comparison['summary']
         }
         
-        return JSONResponse(content=response)
+        return ORJSONResponse(response)
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -238,26 +355,13 @@ async def compare_images(
 @app.get("/api/damage-classes")
 async def get_damage_classes():
     """Get list of all detectable damage classes"""
-    return {
-        "total_classes": len(DamageDetector.DAMAGE_CLASSES),
-        "classes": DamageDetector.DAMAGE_CLASSES,
-        "categories": {
-            "dents": [c for c in DamageDetector.DAMAGE_CLASSES if 'dent' in c.lower()],
-            "scratches": [c for c in DamageDetector.DAMAGE_CLASSES if 'scratch' in c.lower()],
-            "paint": [c for c in DamageDetector.DAMAGE_CLASSES if 'paint' in c.lower()],
-            "glass_lights": [c for c in DamageDetector.DAMAGE_CLASSES 
-                           if any(x in c.lower() for x in ['windscreen', 'light', 'mirror'])]
-        }
-    }
+    return _CLASSES_PAYLOAD
 
 
 @app.get("/api/repair-costs")
 async def get_repair_costs():
     """Get repair cost estimation matrix"""
-    return {
-        "currency": "USD",
-        "costs": DamageDetector.REPAIR_COSTS
-    }
+    return _COSTS_PAYLOAD
 
 
 if __name__ == "__main__":
@@ -13,6 +13,9 @@ HOST = os.getenv("HOST", "127.0.0.1")
 PORT = int(os.getenv("PORT", 7860))
 FASTAPI_PORT = int(os.getenv("FASTAPI_PORT", 8000))
 
+# Upload Limits
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 20 * 1024 * 1024))
+
 # Model Configuration
 CONFIDENCE_THRESHOLD = float(os.getenv("CONFIDENCE_THRESHOLD", 0.25))
 
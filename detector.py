@@ -5,10 +5,265 @@ Core detection module using Roboflow API
 
 import os
 import base64
+import hashlib
+import queue
+import threading
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
-from typing import List, Dict, Tuple
+from collections import Counter, OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import repeat
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import List, Dict, Tuple, Optional, Union, Iterable
+
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJSAMP_420, TJFLAG_PROGRESSIVE
+    _turbo = TurboJPEG()
+except (ImportError, OSError, RuntimeError):
+    # PyTurboJPEG or the libjpeg-turbo shared library is unavailable
+    _turbo = None
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+# Label font, loaded once per process
+try:
+    _FONT = ImageFont.truetype("arial.ttf", 20)
+except OSError:
+    _FONT = ImageFont.load_default()
+
+# Default severity -> box color mapping for draw_detections()
+_DEFAULT_COLOR_MAP = MappingProxyType({
+    'minor': 'yellow',
+    'moderate': 'orange',
+    'severe': 'red'
+})
+
+# Reusable JPEG serialization buffers (most recently returned first); each
+# keeps the capacity of its largest encode so later saves do not regrow it
+_BUFFER_POOL_SIZE = 32
+_buffer_pool = queue.LifoQueue(maxsize=_BUFFER_POOL_SIZE)
+for _ in range(_BUFFER_POOL_SIZE):
+    _buffer_pool.put_nowait(BytesIO())
+
+
+@contextmanager
+def _get_buffer():
+    """
+    Borrow a BytesIO from the pool, positioned at 0
+    
+    Buffers are rewound but not truncated, so they keep their allocation;
+    only the first tell() bytes written by the borrower are valid, anything
+    after that is left over from a previous use (see _written()).
+    """
+    try:
+        buf = _buffer_pool.get_nowait()
+    except queue.Empty:
+        buf = BytesIO()
+    try:
+        yield buf
+    finally:
+        buf.seek(0)
+        try:
+            _buffer_pool.put_nowait(buf)
+        except queue.Full:
+            pass
+
+
+@contextmanager
+def _written(buf: BytesIO):
+    """Zero-copy view of the bytes written to a pooled buffer so far"""
+    with buf.getbuffer() as view:
+        with view[:buf.tell()] as data:
+            yield data
+
+
+def is_jpeg(contents: bytes) -> bool:
+    """Whether contents starts with the JPEG start-of-image marker"""
+    return contents[:2] == b'\xff\xd8'
+
+
+def decode_image(contents: bytes) -> Image.Image:
+    """
+    Decode uploaded image bytes into an RGB PIL Image
+    
+    JPEG input goes through libjpeg-turbo when available; everything else
+    (PNG, WebP, ...) and JPEGs turbo cannot decode to RGB (CMYK/YCCK) fall
+    back to Pillow.
+    
+    Args:
+        contents: Raw image file bytes
+        
+    Returns:
+        RGB PIL Image
+    """
+    if _turbo is not None and is_jpeg(contents):
+        try:
+            pixels = _turbo.decode(contents, pixel_format=TJPF_RGB)
+        except OSError:
+            pass
+        else:
+            image = Image.fromarray(pixels)
+            image.format = 'JPEG'
+            return image
+    
+    image = Image.open(BytesIO(contents))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def encode_jpeg(image: Image.Image, quality: int = 85,
+                progressive: bool = False) -> bytes:
+    """
+    Encode a PIL Image as 4:2:0 JPEG bytes, using libjpeg-turbo when available
+    
+    Args:
+        image: PIL Image
+        quality: JPEG quality (1-100)
+        progressive: Write a progressive JPEG
+        
+    Returns:
+        JPEG file bytes
+    """
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    
+    if _turbo is not None:
+        return _turbo.encode(np.asarray(image), quality=quality,
+                             pixel_format=TJPF_RGB, jpeg_subsample=TJSAMP_420,
+                             flags=TJFLAG_PROGRESSIVE if progressive else 0)
+    
+    with _get_buffer() as buf:
+        image.save(buf, format='JPEG', quality=quality, optimize=False,
+                   subsampling=2, progressive=progressive)
+        with _written(buf) as data:
+            return bytes(data)
+
+
+def _save_base64(image: Image.Image, **save_kwargs) -> str:
+    """Save image with Pillow into a pooled buffer and return it as base64"""
+    with _get_buffer() as buf:
+        image.save(buf, **save_kwargs)
+        # Encoding straight from the view avoids a getvalue() copy
+        with _written(buf) as data:
+            return base64.b64encode(data).decode('ascii')
+
+
+def encode_jpeg_base64(image: Image.Image, quality: int = 85,
+                       progressive: bool = False) -> str:
+    """
+    Encode a PIL Image as base64 JPEG text
+    
+    Args:
+        image: PIL Image
+        quality: JPEG quality (1-100)
+        progressive: Write a progressive JPEG
+        
+    Returns:
+        Base64 (ASCII) string of the JPEG bytes
+    """
+    if _turbo is not None:
+        return base64.b64encode(encode_jpeg(image, quality, progressive)).decode('ascii')
+    
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    
+    return _save_base64(image, format='JPEG', quality=quality, optimize=False,
+                        subsampling=2, progressive=progressive)
+
+
+def encode_webp_base64(image: Image.Image, quality: int = 80) -> str:
+    """
+    Encode a PIL Image as base64 WebP text
+    
+    Args:
+        image: PIL Image
+        quality: WebP quality (1-100)
+        
+    Returns:
+        Base64 (ASCII) string of the WebP bytes
+    """
+    return _save_base64(image, format='WEBP', quality=quality, method=4)
+
+
+def _content_digest(data: bytes) -> bytes:
+    """Content hash of encoded image bytes, used in inference cache keys"""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _build_cost_table(classes: List[str], costs: Dict[str, Dict[str, int]],
+                      default: Dict[str, int], severities: Tuple[str, ...]) -> np.ndarray:
+    """
+    Flatten the repair cost matrix into an int array indexed by
+    (class index, severity index); the extra last row holds default costs
+    for unknown classes
+    """
+    rows = [[costs.get(c, default)[sev] for sev in severities] for c in classes]
+    rows.append([default[sev] for sev in severities])
+    return np.array(rows, dtype=np.int32)
+
+
+def costs_from_ids(cls_ids: np.ndarray, sev_ids: np.ndarray,
+                   table: np.ndarray) -> np.ndarray:
+    """Look up table[cls_ids[i], sev_ids[i]] for every i"""
+    return table[cls_ids, sev_ids]
+
+
+@dataclass
+class DecodedImage:
+    """
+    An upload decoded exactly once, kept with the JPEG bytes used for inference
+    
+    Detection and drawing both work on this single bitmap, so a request never
+    decodes, re-encodes or copies the same pixels twice. The cache digest and
+    base64 request body are computed on construction as well, so that
+    detect_damages_async() does no hashing or encoding on the event loop.
+    
+    Attributes:
+        image: RGB PIL Image holding the decoded pixels
+        jpeg_bytes: JPEG encoding of image sent to Roboflow
+        format: Source file format (e.g. 'JPEG', 'PNG'), if known
+        jpeg_digest: Content hash of jpeg_bytes
+        jpeg_b64: Base64 encoding of jpeg_bytes
+    """
+    image: Image.Image
+    jpeg_bytes: bytes
+    format: Optional[str] = None
+    jpeg_digest: bytes = field(init=False, repr=False)
+    jpeg_b64: bytes = field(init=False, repr=False)
+    
+    def __post_init__(self):
+        self.jpeg_digest = _content_digest(self.jpeg_bytes)
+        self.jpeg_b64 = base64.b64encode(self.jpeg_bytes)
+    
+    @property
+    def size(self) -> Tuple[int, int]:
+        """(width, height) of the image"""
+        return self.image.size
+    
+    @classmethod
+    def from_bytes(cls, contents: bytes) -> 'DecodedImage':
+        """
+        Decode image file bytes
+        
+        JPEG files (detected by their magic bytes, not a client-supplied
+        content type) are forwarded as-is; other formats are encoded to JPEG
+        once here.
+        
+        Args:
+            contents: Raw image file bytes
+        """
+        image = decode_image(contents)
+        jpeg_bytes = contents if is_jpeg(contents) else encode_jpeg(image)
+        return cls(image=image, jpeg_bytes=jpeg_bytes, format=image.format)
+
+
+ImageInput = Union[Image.Image, DecodedImage]
 
 
 class DamageDetector:
@@ -58,6 +313,38 @@ class DamageDetector:
         'Sidemirror-Damage': {'minor': 100, 'moderate': 300, 'severe': 600},
     }
     
+    # Damage types assessed with tighter severity thresholds
+    _CRITICAL = frozenset({'Major-Rear-Bumper-Dent', 'Front-Windscreen-Damage',
+                           'Rear-windscreen-Damage'})
+    
+    # Severity thresholds on bbox/image area ratio: a ratio above the first
+    # cutoff is moderate, above the second severe
+    _SEV_LABELS = ('minor', 'moderate', 'severe')
+    _STD_THRESH = (0.03, 0.08)
+    _CRIT_THRESH = (0.02, 0.05)
+    
+    # Repair costs for classes missing from REPAIR_COSTS
+    _DEFAULT_COSTS = {'minor': 100, 'moderate': 100, 'severe': 100}
+    
+    # REPAIR_COSTS as a (class, severity) int table for vectorized lookups
+    CLASS2IDX = {c: i for i, c in enumerate(DAMAGE_CLASSES)}
+    SEV2IDX = {sev: i for i, sev in enumerate(_SEV_LABELS)}
+    COST_TABLE = _build_cost_table(DAMAGE_CLASSES, REPAIR_COSTS,
+                                   _DEFAULT_COSTS, _SEV_LABELS)
+    
+    # Roboflow hosted inference endpoint
+    API_URL = "https://serverless.roboflow.com"
+    
+    # Hosted object detection takes the base64 image as a form-encoded body
+    _INFER_HEADERS = {'Content-Type': 'application/x-www-form-urlencoded'}
+    INFER_TIMEOUT = 30.0
+    
+    # Concurrent Roboflow requests per detect_damages_batch() call
+    INFER_WORKERS = 8
+    
+    # Maximum number of inference results kept in the LRU cache
+    INFER_CACHE_SIZE = 512
+    
     def __init__(self, api_key: str, model_id: str):
         """
         Initialize Roboflow damage detector
@@ -68,32 +355,73 @@ class DamageDetector:
         """
         self.api_key = api_key
         self.model_id = model_id
-        self.client = None
+        self._session = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.INFER_WORKERS, thread_name_prefix='roboflow'
+        )
+        self._http = None
+        self._infer_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cache_hits = 0
+        self._cache_misses = 0
         self._initialize_client()
     
     def _initialize_client(self):
-        """Initialize Roboflow API client"""
+        """Initialize the HTTP session used for Roboflow API calls"""
         try:
-            from inference_sdk import InferenceHTTPClient
-            self.client = InferenceHTTPClient(
-                api_url="https://serverless.roboflow.com",
-                api_key=self.api_key
-            )
+            self._session = self._create_session()
             print(f"✓ Roboflow API initialized")
             print(f"  Model: {self.model_id}")
         except ImportError:
             raise ImportError(
-                "inference-sdk not installed. Run: pip install inference-sdk"
+                "requests not installed. Run: pip install requests"
             )
         except Exception as e:
             raise RuntimeError(f"Failed to initialize Roboflow client: {e}")
     
-    def detect_damages(self, image: Image.Image) -> List[Dict]:
+    @staticmethod
+    def _create_session():
+        """
+        Create the pooled keep-alive session used for synchronous inference
+        
+        Reusing connections saves a TCP+TLS handshake on every Roboflow call.
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+        
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(
+            pool_connections=16, pool_maxsize=32, pool_block=False
+        ))
+        session.headers['Connection'] = 'keep-alive'
+        return session
+    
+    def _infer(self, img_bytes: bytes) -> Dict:
+        """
+        Run hosted inference on JPEG bytes over the pooled session
+        
+        Returns:
+            Raw Roboflow inference response
+        """
+        response = self._session.post(
+            f"{self.API_URL}/{self.model_id}",
+            params={'api_key': self.api_key},
+            data=base64.b64encode(img_bytes),
+            headers=self._INFER_HEADERS,
+            timeout=self.INFER_TIMEOUT
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    def detect_damages(self, image: ImageInput,
+                       raw_jpeg_bytes: Optional[bytes] = None) -> List[Dict]:
         """
         Detect damages in an image using Roboflow API
         
         Args:
-            image: PIL Image object
+            image: PIL Image or DecodedImage
+            raw_jpeg_bytes: Original JPEG bytes of image, if available;
+                sent as-is instead of re-encoding the image
             
         Returns:
             List of damage detections with format:
@@ -105,154 +433,392 @@ class DamageDetector:
                 'estimated_cost': int
             }]
         """
-        # Convert image to base64
-        img_byte_arr = BytesIO()
-        image.save(img_byte_arr, format='JPEG')
-        img_base64 = base64.b64encode(img_byte_arr.getvalue()).decode('utf-8')
+        img_bytes = self._jpeg_bytes(image, raw_jpeg_bytes)
+        
+        # Identical images skip the Roboflow round-trip entirely
+        key = self._cache_key(img_bytes)
+        detections = self._cache_get(key)
+        if detections is not None:
+            return detections
         
         # Call Roboflow API
-        result = self.client.infer(img_base64, model_id=self.model_id)
-        
-        # Parse detections
-        detections = []
-        img_array = np.array(image)
-        h, w = img_array.shape[:2]
-        
-        if 'predictions' in result:
-            for pred in result['predictions']:
-                # Convert from center coords to corners
-                x_center, y_center = pred['x'], pred['y']
-                width, height = pred['width'], pred['height']
-                
-                x1 = int(x_center - width / 2)
-                y1 = int(y_center - height / 2)
-                x2 = int(x_center + width / 2)
-                y2 = int(y_center + height / 2)
-                
-                class_name = pred['class']
-                confidence = pred['confidence']
-                
-                # Estimate severity
-                severity = self._estimate_severity(x1, y1, x2, y2, class_name, (h, w))
-                
-                # Get repair cost
-                cost = self.REPAIR_COSTS.get(class_name, {}).get(severity, 100)
-                
-                detections.append({
-                    'bbox': [x1, y1, x2, y2],
-                    'confidence': confidence,
-                    'class': class_name,
-                    'severity': severity,
-                    'estimated_cost': cost
-                })
+        result = self._infer(img_bytes)
         
+        detections = self._parse_predictions(result, image.size)
+        
+        self._cache_put(key, detections)
         return detections
     
-    def _estimate_severity(self, x1: int, y1: int, x2: int, y2: int, 
-                          damage_class: str, img_shape: Tuple[int, int]) -> str:
+    def detect_damages_batch(self, images: List[ImageInput],
+                             raw_jpeg_bytes: Optional[List[Optional[bytes]]] = None) -> List[List[Dict]]:
+        """
+        Detect damages in several images concurrently
+        
+        Hosted inference takes one image per request, so this is not a single
+        batched call: cached images are served locally, and each remaining
+        distinct image is posted once, in parallel on the detector's thread
+        pool over the pooled session.
+        
+        Args:
+            images: PIL Images or DecodedImages
+            raw_jpeg_bytes: Optional original JPEG bytes per image (or None)
+            
+        Returns:
+            One list of damage detections per image, in input order
+        """
+        if raw_jpeg_bytes is None:
+            raw_jpeg_bytes = [None] * len(images)
+        
+        results = []
+        # Cache misses by key: (JPEG bytes, indices of the images sharing them)
+        pending = {}
+        for i, (image, raw) in enumerate(zip(images, raw_jpeg_bytes)):
+            img_bytes = self._jpeg_bytes(image, raw)
+            key = self._cache_key(img_bytes)
+            detections = self._cache_get(key)
+            results.append(detections)
+            if detections is None:
+                pending.setdefault(key, (img_bytes, []))[1].append(i)
+        
+        payloads = [img_bytes for img_bytes, _ in pending.values()]
+        if len(payloads) == 1:
+            responses = [self._infer(payloads[0])]
+        else:
+            responses = list(self._executor.map(self._infer, payloads))
+        
+        for (key, (_, indices)), result in zip(pending.items(), responses):
+            detections = self._parse_predictions(result, images[indices[0]].size)
+            self._cache_put(key, detections)
+            results[indices[0]] = detections
+            for i in indices[1:]:
+                results[i] = self._copy_detections(detections)
+        
+        return results
+    
+    def start_http_client(self):
+        """Create the pooled async HTTP client used by detect_damages_async()"""
+        if self._http is not None:
+            return
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError(
+                "httpx not installed. Run: pip install 'httpx[http2]'"
+            )
+        self._http = httpx.AsyncClient(
+            base_url=self.API_URL,
+            http2=True,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+            timeout=self.INFER_TIMEOUT
+        )
+    
+    async def close_http_client(self):
+        """Close the async HTTP client and its pooled connections"""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+    
+    async def detect_damages_async(self, image: ImageInput,
+                                   raw_jpeg_bytes: Optional[bytes] = None) -> List[Dict]:
         """
-        Estimate damage severity based on size and type
+        Detect damages without blocking the event loop on the Roboflow call
         
         Args:
-            x1, y1, x2, y2: Bounding box coordinates
-            damage_class: Type of damage
-            img_shape: (height, width) of image
+            image: PIL Image or DecodedImage
+            raw_jpeg_bytes: Original JPEG bytes of image, if available
             
         Returns:
-            'minor', 'moderate', or 'severe'
+            List of damage detections (see detect_damages)
         """
-        h, w = img_shape
-        bbox_area = (x2 - x1) * (y2 - y1)
-        img_area = h * w
-        damage_ratio = bbox_area / img_area
-        
-        # Critical damage types
-        critical_types = ['Major-Rear-Bumper-Dent', 'Front-Windscreen-Damage', 
-                         'Rear-windscreen-Damage']
-        
-        if damage_class in critical_types:
-            if damage_ratio > 0.05:
-                return 'severe'
-            elif damage_ratio > 0.02:
-                return 'moderate'
-            else:
-                return 'minor'
-        
-        # Standard damage assessment
-        if damage_ratio > 0.08:
-            return 'severe'
-        elif damage_ratio > 0.03:
-            return 'moderate'
+        if raw_jpeg_bytes is None and isinstance(image, DecodedImage):
+            # Hashed and encoded off the loop when the DecodedImage was built
+            key = (image.jpeg_digest, self.model_id)
+            payload = image.jpeg_b64
         else:
-            return 'minor'
+            img_bytes = self._jpeg_bytes(image, raw_jpeg_bytes)
+            key = self._cache_key(img_bytes)
+            payload = None
+        
+        detections = self._cache_get(key)
+        if detections is not None:
+            return detections
+        
+        if payload is None:
+            payload = base64.b64encode(img_bytes)
+        
+        if self._http is None:
+            self.start_http_client()
+        
+        # Same request as _infer(), on the async client
+        response = await self._http.post(
+            f"/{self.model_id}",
+            params={'api_key': self.api_key},
+            content=payload,
+            headers=self._INFER_HEADERS
+        )
+        response.raise_for_status()
+        
+        detections = self._parse_predictions(response.json(), image.size)
+        
+        self._cache_put(key, detections)
+        return detections
+    
+    @staticmethod
+    def _jpeg_bytes(image: ImageInput, raw_jpeg_bytes: Optional[bytes]) -> bytes:
+        """JPEG bytes to send for inference, encoding only when none are at hand"""
+        if raw_jpeg_bytes is not None:
+            return raw_jpeg_bytes
+        if isinstance(image, DecodedImage):
+            return image.jpeg_bytes
+        return encode_jpeg(image)
     
-    def draw_detections(self, image: Image.Image, detections: List[Dict], 
-                       color_map: Dict[str, str] = None) -> Image.Image:
+    def _parse_predictions(self, result: Dict,
+                           image_size: Tuple[int, int]) -> List[Dict]:
         """
-        Draw bounding boxes on image
+        Convert raw Roboflow predictions into damage detections
+        
+        All predictions are processed as one NumPy batch rather than one
+        Python iteration per box.
         
         Args:
-            image: PIL Image
-            detections: List of detections from detect_damages()
-            color_map: Optional severity color mapping
+            result: Roboflow inference response
+            image_size: (width, height) of the inferred image
             
         Returns:
-            Annotated PIL Image
+            List of damage detections (see detect_damages)
         """
-        if color_map is None:
-            color_map = {
-                'minor': 'yellow',
-                'moderate': 'orange',
-                'severe': 'red'
+        preds = result.get('predictions') or []
+        if not preds:
+            return []
+        
+        w, h = image_size
+        boxes = np.array(
+            [[p['x'], p['y'], p['width'], p['height']] for p in preds],
+            dtype=np.float64
+        )
+        classes = [p['class'] for p in preds]
+        
+        # Convert from center coords to corners (truncating like int())
+        half_w = boxes[:, 2] / 2
+        half_h = boxes[:, 3] / 2
+        x1 = (boxes[:, 0] - half_w).astype(np.int64)
+        y1 = (boxes[:, 1] - half_h).astype(np.int64)
+        x2 = (boxes[:, 0] + half_w).astype(np.int64)
+        y2 = (boxes[:, 1] + half_h).astype(np.int64)
+        
+        # Estimate severity from bbox/image area ratio; searchsorted (side
+        # 'left') counts cutoffs strictly below the ratio, so a ratio exactly
+        # on a cutoff stays in the lower severity
+        ratios = ((x2 - x1) * (y2 - y1)) / (h * w)
+        critical = np.fromiter((c in self._CRITICAL for c in classes),
+                               dtype=bool, count=len(classes))
+        levels = np.where(
+            critical,
+            np.searchsorted(self._CRIT_THRESH, ratios),
+            np.searchsorted(self._STD_THRESH, ratios)
+        )
+        severities = [self._SEV_LABELS[i] for i in levels.tolist()]
+        
+        costs = self.estimate_costs(classes, severities).tolist()
+        
+        bboxes = np.stack([x1, y1, x2, y2], axis=1).tolist()
+        
+        return [
+            {
+                'bbox': bbox,
+                'confidence': pred['confidence'],
+                'class': class_name,
+                'severity': severity,
+                'estimated_cost': cost
             }
+            for pred, class_name, bbox, severity, cost
+            in zip(preds, classes, bboxes, severities, costs)
+        ]
+    
+    @classmethod
+    def estimate_costs(cls, classes: List[str], severities: List[str]) -> np.ndarray:
+        """
+        Look up repair costs for parallel lists of classes and severities
         
-        img_copy = image.copy()
-        draw = ImageDraw.Draw(img_copy)
+        Args:
+            classes: Damage class names (unknown classes get default costs)
+            severities: 'minor', 'moderate' or 'severe' per class
+            
+        Returns:
+            int32 array of repair costs (USD)
+        """
+        unknown = len(cls.DAMAGE_CLASSES)
+        cls_ids = np.fromiter((cls.CLASS2IDX.get(c, unknown) for c in classes),
+                              dtype=np.intp, count=len(classes))
+        sev_ids = np.fromiter((cls.SEV2IDX[sev] for sev in severities),
+                              dtype=np.intp, count=len(severities))
+        return costs_from_ids(cls_ids, sev_ids, cls.COST_TABLE)
+    
+    def _cache_key(self, img_bytes: bytes) -> Tuple[bytes, str]:
+        """Inference cache key: content hash of the encoded image plus model"""
+        return (_content_digest(img_bytes), self.model_id)
+    
+    @staticmethod
+    def _copy_detections(detections: List[Dict]) -> List[Dict]:
+        """Copy detections so callers and the cache never share mutable state"""
+        return [{**d, 'bbox': list(d['bbox'])} for d in detections]
+    
+    def _cache_get(self, key):
+        """Copy of cached detections for key (marked recently used), or None"""
+        with self._cache_lock:
+            detections = self._infer_cache.get(key)
+            if detections is None:
+                self._cache_misses += 1
+                return None
+            self._infer_cache.move_to_end(key)
+            self._cache_hits += 1
+        return self._copy_detections(detections)
+    
+    def _cache_put(self, key, detections: List[Dict]):
+        """Store a copy of detections, evicting the LRU entry when full"""
+        detections = self._copy_detections(detections)
+        with self._cache_lock:
+            self._infer_cache[key] = detections
+            self._infer_cache.move_to_end(key)
+            if len(self._infer_cache) > self.INFER_CACHE_SIZE:
+                self._infer_cache.popitem(last=False)
+    
+    def cache_info(self) -> CacheInfo:
+        """
+        Report inference cache statistics
         
-        try:
-            font = ImageFont.truetype("arial.ttf", 20)
-        except:
-            font = ImageFont.load_default()
+        Returns:
+            CacheInfo(hits, misses, maxsize, currsize), like functools.lru_cache
+        """
+        with self._cache_lock:
+            return CacheInfo(self._cache_hits, self._cache_misses,
+                             self.INFER_CACHE_SIZE, len(self._infer_cache))
+    
+    def cache_clear(self):
+        """Drop all cached inference results and reset statistics"""
+        with self._cache_lock:
+            self._infer_cache.clear()
+            self._cache_hits = 0
+            self._cache_misses = 0
+    
+    @staticmethod
+    def _draw_boxes(image: ImageInput, detections: List[Dict],
+                    colors: Iterable[str], in_place: bool) -> Image.Image:
+        """
+        Draw a labeled box per detection, each in the matching color
         
-        for det in detections:
-            x1, y1, x2, y2 = det['bbox']
-            severity = det['severity']
-            class_name = det['class']
-            confidence = det['confidence']
+        Args:
+            image: PIL Image or DecodedImage
+            detections: List of detections from detect_damages()
+            colors: One box and label color per detection
+            in_place: Draw directly on image instead of a copy
             
-            color = color_map.get(severity, 'red')
+        Returns:
+            Annotated PIL Image
+        """
+        if isinstance(image, DecodedImage):
+            image = image.image
+        img_copy = image if in_place else image.copy()
+        draw = ImageDraw.Draw(img_copy)
+        font = _FONT
+        
+        for det, color in zip(detections, colors):
+            x1, y1, x2, y2 = det['bbox']
             
             # Draw bounding box
             draw.rectangle([x1, y1, x2, y2], outline=color, width=3)
             
             # Draw label
-            label = f"{class_name} ({confidence*100:.1f}%)"
+            label = f"{det['class']} ({det['confidence']*100:.1f}%)"
             draw.rectangle([x1, y1-25, x1+len(label)*10, y1], fill=color)
             draw.text((x1+5, y1-22), label, fill='white', font=font)
         
         return img_copy
     
+    def draw_detections(self, image: ImageInput, detections: List[Dict], 
+                       color_map: Dict[str, str] = None,
+                       in_place: bool = False) -> Image.Image:
+        """
+        Draw bounding boxes on image
+        
+        Args:
+            image: PIL Image or DecodedImage
+            detections: List of detections from detect_damages()
+            color_map: Optional severity color mapping
+            in_place: Draw directly on image instead of a copy
+            
+        Returns:
+            Annotated PIL Image
+        """
+        if color_map is None:
+            color_map = _DEFAULT_COLOR_MAP
+        
+        colors = (color_map.get(det['severity'], 'red') for det in detections)
+        return self._draw_boxes(image, detections, colors, in_place)
+    
+    def draw_detections_uniform(self, image: ImageInput, detections: List[Dict],
+                                color: str = 'green',
+                                in_place: bool = False) -> Image.Image:
+        """
+        Draw bounding boxes on image in a single color, ignoring severity
+        
+        Args:
+            image: PIL Image or DecodedImage
+            detections: List of detections from detect_damages()
+            color: Box and label color
+            in_place: Draw directly on image instead of a copy
+            
+        Returns:
+            Annotated PIL Image
+        """
+        return self._draw_boxes(image, detections, repeat(color), in_place)
+    
     def compare_images(self, pickup_img: Image.Image, 
-                      return_img: Image.Image) -> Dict:
+                      return_img: Image.Image,
+                      pickup_jpeg_bytes: Optional[bytes] = None,
+                      return_jpeg_bytes: Optional[bytes] = None) -> Dict:
         """
         Compare pickup and return images to find new damages
         
         Args:
             pickup_img: Image from vehicle pickup
             return_img: Image from vehicle return
+            pickup_jpeg_bytes: Original JPEG bytes of pickup_img, if available
+            return_jpeg_bytes: Original JPEG bytes of return_img, if available
             
         Returns:
             Dictionary with comparison results
         """
-        pickup_damages = self.detect_damages(pickup_img)
-        return_damages = self.detect_damages(return_img)
+        pickup_damages, return_damages = self.detect_damages_batch(
+            [pickup_img, return_img],
+            [pickup_jpeg_bytes, return_jpeg_bytes]
+        )
         
-        # Find new damages (simple heuristic based on class count)
-        pickup_classes = [d['class'] for d in pickup_damages]
-        new_damages = [d for d in return_damages 
-                      if d['class'] not in pickup_classes or 
-                      pickup_classes.count(d['class']) < 
-                      [d['class'] for d in return_damages].count(d['class'])]
+        return self.compare_detections(pickup_damages, return_damages)
+    
+    def compare_detections(self, pickup_damages: List[Dict],
+                           return_damages: List[Dict]) -> Dict:
+        """
+        Compare already detected pickup and return damages
+        
+        Args:
+            pickup_damages: Detections from the pickup image
+            return_damages: Detections from the return image
+            
+        Returns:
+            Dictionary with comparison results
+        """
+        # Find new damages (simple heuristic based on class count): for each
+        # class, the return detections beyond the pickup count are new
+        pickup_ct = Counter(d['class'] for d in pickup_damages)
+        return_ct = Counter(d['class'] for d in return_damages)
+        new_damages = []
+        seen = Counter()
+        for d in return_damages:
+            c = d['class']
+            if seen[c] < return_ct[c] - pickup_ct[c]:
+                new_damages.append(d)
+                seen[c] += 1
         
         total_new_cost = sum(d['estimated_cost'] for d in new_damages)
         
@@ -263,3 +829,26 @@ class DamageDetector:
             'total_new_cost': total_new_cost,
             'summary': f"Found {len(new_damages)} new damage(s). Estimated cost: ${total_new_cost}"
         }
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_detector() -> DamageDetector:
+    """
+    Return the process-wide DamageDetector, creating it on first use
+    
+    The API and UI share this instance (and with it the Roboflow clients
+    and the inference cache) when served from one process.
+    """
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                from config import ROBOFLOW_API_KEY, ROBOFLOW_MODEL_ID
+                _detector = DamageDetector(
+                    api_key=ROBOFLOW_API_KEY,
+                    model_id=ROBOFLOW_MODEL_ID
+                )
+    return _detector
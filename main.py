@@ -5,16 +5,8 @@ Run UI and API servers
 
 import subprocess
 import sys
-import time
-from multiprocessing import Process
 
-def run_ui():
-    """Launch Gradio UI"""
-    subprocess.run([sys.executable, "ui.py"])
-
-def run_api():
-    """Launch FastAPI server"""
-    subprocess.run([sys.executable, "api.py"])
+from config import HOST, PORT, FASTAPI_PORT
 
 def main():
     print("=" * 60)
@@ -35,32 +27,31 @@ def main():
     if choice == "1":
         print("🚀 Launching UI...")
         print("   Access at: http://127.0.0.1:7860")
-        run_ui()
+        from ui import demo
+        demo.launch(share=False, server_name=HOST, server_port=PORT)
     
     elif choice == "2":
         print("🚀 Launching API...")
         print("   Access at: http://127.0.0.1:8000")
         print("   Docs at: http://127.0.0.1:8000/api/docs")
-        run_api()
+        import uvicorn
+        from api import app
+        uvicorn.run(app, host=HOST, port=FASTAPI_PORT)
     
     elif choice == "3":
         print("🚀 Launching UI + API...")
-        print("   UI: http://127.0.0.1:7860")
+        print("   UI: http://127.0.0.1:8000/ui")
         print("   API: http://127.0.0.1:8000/api/docs")
         print()
         
-        # Start API in background
-        api_process = Process(target=run_api)
-        api_process.start()
-        
-        time.sleep(2)  # Give API time to start
+        # Serve the Gradio app from the API's Uvicorn process
+        import gradio as gr
+        import uvicorn
+        from api import app
+        from ui import demo
         
-        # Start UI in main process
-        try:
-            run_ui()
-        finally:
-            api_process.terminate()
-            api_process.join()
+        app = gr.mount_gradio_app(app, demo, path="/ui")
+        uvicorn.run(app, host=HOST, port=FASTAPI_PORT)
     
     elif choice == "4":
         print("🧪 Running tests...")
@@ -5,10 +5,24 @@ Tests detector, API endpoints, and system integration
 
 import sys
 import os
-from PIL import Image, ImageDraw
-import numpy as np
-import requests
-import json
+import traceback
+from functools import lru_cache
+from io import BytesIO
+import orjson
+
+# numpy, PIL, requests and the detector module are imported inside the
+# tests that need them, so running a single test stays cheap
+
+
+@lru_cache(maxsize=None)
+def _session():
+    """Shared HTTP session so API tests reuse one keep-alive connection"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    
+    session = requests.Session()
+    session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=4))
+    return session
 
 # Colors for terminal output
 class Colors:
@@ -31,22 +45,50 @@ def print_warning(msg):
     print(f"{Colors.YELLOW}⚠ {msg}{Colors.END}")
 
 
-def create_test_image(width=640, height=480, damage_boxes=2):
-    """Create a synthetic test image with simulated damages"""
-    img = Image.new('RGB', (width, height), color='lightgray')
-    draw = ImageDraw.Draw(img)
+@lru_cache(maxsize=8)
+def _render_test_image(width, height, damage_boxes):
+    """Rasterize a synthetic test image (cached; callers must not modify it)"""
+    import numpy as np
+    from PIL import Image
     
-    # Draw car outline
-    draw.rectangle([50, 100, width-50, height-100], outline='black', width=5)
+    arr = np.full((height, width, 3), 211, dtype=np.uint8)  # lightgray
     
-    # Add damage markers
+    # Draw car outline (5 px black border of [50, 100, width-50, height-100])
+    x1, y1, x2, y2 = 50, 100, width - 50, height - 100
+    arr[y1:y1+5, x1:x2+1] = 0
+    arr[y2-4:y2+1, x1:x2+1] = 0
+    arr[y1:y2+1, x1:x1+5] = 0
+    arr[y1:y2+1, x2-4:x2+1] = 0
+    
+    # Add damage markers (3 px red border of [x, y, x+80, y+60])
     for i in range(damage_boxes):
         x = 100 + i * 200
         y = 150 + i * 50
-        draw.rectangle([x, y, x+80, y+60], outline='red', width=3)
-        draw.text((x+10, y+20), f"Damage {i+1}", fill='red')
+        arr[y:y+3, x:x+81] = (255, 0, 0)
+        arr[y+58:y+61, x:x+81] = (255, 0, 0)
+        arr[y:y+61, x:x+3] = (255, 0, 0)
+        arr[y:y+61, x+78:x+81] = (255, 0, 0)
     
-    return img
+    return Image.fromarray(arr, 'RGB')
+
+
+def create_test_image(width=640, height=480, damage_boxes=2):
+    """Create a synthetic test image with simulated damages"""
+    return _render_test_image(width, height, damage_boxes).copy()
+
+
+# Encoded JPEG bytes of test images, keyed by (width, height, damage_boxes)
+_JPEG_CACHE = {}
+
+
+def create_test_jpeg(width=640, height=480, damage_boxes=2):
+    """Return JPEG bytes of a synthetic test image, encoding it only once"""
+    key = (width, height, damage_boxes)
+    if key not in _JPEG_CACHE:
+        img_bytes = BytesIO()
+        _render_test_image(*key).save(img_bytes, format='JPEG', quality=85, optimize=False)
+        _JPEG_CACHE[key] = img_bytes.getvalue()
+    return _JPEG_CACHE[key]
 
 
 def test_detector_initialization():
@@ -96,7 +138,6 @@ def test_damage_detection(detector):
         return True
     except Exception as e:
         print_error(f"Detection failed: {e}")
-        import traceback
         traceback.print_exc()
         return False
 
@@ -156,8 +197,10 @@ def test_image_comparison(detector):
 def test_api_health():
     """Test 5: API Health Check"""
     print_info("\nTest 5: API Health Check")
+    import requests
+    
     try:
-        response = requests.get("http://127.0.0.1:8000/api/health", timeout=5)
+        response = _session().get("http://127.0.0.1:8000/api/health", timeout=5)
         
         if response.status_code == 200:
             data = response.json()
@@ -180,19 +223,15 @@ def test_api_health():
 def test_api_detect():
     """Test 6: API Detection Endpoint"""
     print_info("\nTest 6: API Detection Endpoint")
+    import requests
+    
     try:
-        # Create test image
-        test_img = create_test_image()
-        
-        # Save to bytes
-        from io import BytesIO
-        img_bytes = BytesIO()
-        test_img.save(img_bytes, format='JPEG')
-        img_bytes.seek(0)
+        # Create test image bytes (encoded once per process)
+        img_bytes = BytesIO(create_test_jpeg())
         
         # Make API request
         files = {'file': ('test.jpg', img_bytes, 'image/jpeg')}
-        response = requests.post(
+        response = _session().post(
             "http://127.0.0.1:8000/api/detect",
             files=files,
             timeout=30
@@ -206,7 +245,7 @@ def test_api_detect():
             
             # Save response
             with open('test_output/api_response.json', 'w') as f:
-                json.dump(data, f, indent=2)
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2).decode())
             print_success("Saved API response to: test_output/api_response.json")
             
             return True
@@ -236,13 +275,19 @@ def test_cost_estimation():
         ]
         
         print_success("Testing cost estimation:")
-        total = 0
-        for damage_type, severity in sample_damages:
-            cost = DamageDetector.REPAIR_COSTS.get(damage_type, {}).get(severity, 0)
-            total += cost
+        damage_types, severities = zip(*sample_damages)
+        costs = DamageDetector.estimate_costs(damage_types, severities).tolist()
+        for damage_type, severity, cost in zip(damage_types, severities, costs):
             print(f"  {damage_type} ({severity}): ${cost}")
         
-        print(f"  Total: ${total}")
+        print(f"  Total: ${sum(costs)}")
+        
+        # Table lookups must agree with the cost matrix
+        expected = [DamageDetector.REPAIR_COSTS[t][sev] for t, sev in sample_damages]
+        if costs != expected:
+            print_error(f"Cost table mismatch: {costs} != {expected}")
+            return False
+        
         print_success("Cost estimation working correctly")
         return True
         
@@ -264,20 +309,25 @@ def test_damage_classes():
         print_success(f"Cost entries: {len(costs)}")
         
         # Check for missing cost definitions
-        missing = [c for c in classes if c not in costs]
+        missing = sorted(set(classes) - costs.keys())
         if missing:
             print_warning(f"Missing cost definitions for: {missing}")
         else:
             print_success("All classes have cost definitions")
         
-        # Categorize
-        dents = [c for c in classes if 'dent' in c.lower()]
-        scratches = [c for c in classes if 'scratch' in c.lower()]
-        glass = [c for c in classes if any(x in c.lower() for x in ['windscreen', 'light', 'mirror'])]
-        
-        print(f"  Dents: {len(dents)}")
-        print(f"  Scratches: {len(scratches)}")
-        print(f"  Glass/Lights: {len(glass)}")
+        # Categorize in a single pass over the classes
+        dents = scratches = glass = 0
+        for c in classes:
+            l = c.lower()
+            if 'dent' in l:
+                dents += 1
+            if 'scratch' in l:
+                scratches += 1
+            if 'windscreen' in l or 'light' in l or 'mirror' in l:
+                glass += 1
+        print(f"  Dents: {dents}")
+        print(f"  Scratches: {scratches}")
+        print(f"  Glass/Lights: {glass}")
         
         return True
         
@@ -286,6 +336,172 @@ def test_damage_classes():
         return False
 
 
+def test_compare_detections(detector):
+    """Test 9: Comparison Counting"""
+    print_info("\nTest 9: Comparison Counting")
+    try:
+        def det(cls, cost):
+            return {'bbox': [0, 0, 10, 10], 'confidence': 0.9, 'class': cls,
+                    'severity': 'minor', 'estimated_cost': cost}
+        
+        # Only the return detections beyond the pickup count of a class are new
+        pickup = [det('bonnet-dent', 150)]
+        returned = [det('bonnet-dent', 150), det('bonnet-dent', 150),
+                    det('paint-chip', 40)]
+        comparison = detector.compare_detections(pickup, returned)
+        
+        new_classes = sorted(d['class'] for d in comparison['new_damages'])
+        if new_classes != ['bonnet-dent', 'paint-chip']:
+            print_error(f"Unexpected new damages: {new_classes}")
+            return False
+        if comparison['total_new_cost'] != 190:
+            print_error(f"Unexpected new cost: ${comparison['total_new_cost']}")
+            return False
+        
+        print_success("1 pickup + 2 return detections of a class count as 1 new damage")
+        
+        # Identical detections yield no new damages
+        comparison = detector.compare_detections(returned, returned)
+        if comparison['new_damages']:
+            print_error("Identical detections reported new damages")
+            return False
+        
+        print_success("Identical detections report no new damages")
+        return True
+        
+    except Exception as e:
+        print_error(f"Comparison counting test failed: {e}")
+        return False
+
+
+def test_inference_cache(detector):
+    """Test 10: Inference Cache"""
+    print_info("\nTest 10: Inference Cache")
+    try:
+        detector.cache_clear()
+        detector.INFER_CACHE_SIZE = 2
+        
+        dets = [{'bbox': [1, 2, 3, 4], 'confidence': 0.5, 'class': 'roof-dent',
+                 'severity': 'minor', 'estimated_cost': 200}]
+        key_a = detector._cache_key(b'a')
+        key_b = detector._cache_key(b'b')
+        key_c = detector._cache_key(b'c')
+        
+        # Miss, then hit
+        if detector._cache_get(key_a) is not None:
+            print_error("Empty cache returned a result")
+            return False
+        detector._cache_put(key_a, dets)
+        cached = detector._cache_get(key_a)
+        if cached != dets:
+            print_error(f"Cache returned {cached}, expected {dets}")
+            return False
+        
+        # Results are copies: mutating one must not change the cache
+        cached[0]['bbox'][0] = -1
+        if detector._cache_get(key_a)[0]['bbox'][0] != 1:
+            print_error("Mutating a cached result changed the cache")
+            return False
+        
+        # a was used most recently, so adding c evicts b
+        detector._cache_put(key_b, dets)
+        detector._cache_get(key_a)
+        detector._cache_put(key_c, dets)
+        if detector._cache_get(key_b) is not None or detector._cache_get(key_a) is None:
+            print_error("Cache did not evict the least recently used entry")
+            return False
+        
+        info = detector.cache_info()
+        print(f"  {info}")
+        if (info.hits, info.misses, info.maxsize, info.currsize) != (4, 2, 2, 2):
+            print_error(f"Unexpected cache statistics: {info}")
+            return False
+        
+        print_success("Cache hits, misses, eviction and cache_info correct")
+        return True
+        
+    except Exception as e:
+        print_error(f"Inference cache test failed: {e}")
+        return False
+    finally:
+        del detector.INFER_CACHE_SIZE
+        detector.cache_clear()
+
+
+def test_upload_limit():
+    """Test 11: Upload Size Limit"""
+    print_info("\nTest 11: Upload Size Limit")
+    try:
+        import asyncio
+        import api
+        from fastapi import HTTPException, UploadFile
+    except Exception as e:
+        print_error(f"Upload limit test failed: {e}")
+        return False
+    
+    limit = api.MAX_UPLOAD_BYTES
+    api.MAX_UPLOAD_BYTES = 1024
+    try:
+        # Within the limit: returned whole
+        upload = UploadFile(BytesIO(b'x' * 1024))
+        if len(asyncio.run(api._read_upload(upload))) != 1024:
+            print_error("Upload within the limit was not read whole")
+            return False
+        
+        # Over the limit, both with and without a declared size
+        for size in (1025, None):
+            upload = UploadFile(BytesIO(b'x' * 1025), size=size)
+            try:
+                asyncio.run(api._read_upload(upload))
+            except HTTPException as e:
+                if e.status_code != 413:
+                    print_error(f"Oversized upload returned {e.status_code}, expected 413")
+                    return False
+            else:
+                print_error("Oversized upload was accepted")
+                return False
+        
+        print_success("Uploads over MAX_UPLOAD_BYTES rejected with 413")
+        return True
+        
+    except Exception as e:
+        print_error(f"Upload limit test failed: {e}")
+        return False
+    finally:
+        api.MAX_UPLOAD_BYTES = limit
+
+
+def test_annotated_formats():
+    """Test 12: Annotated Image Formats"""
+    print_info("\nTest 12: Annotated Image Formats")
+    try:
+        import base64
+        import api
+        
+        dets = [{'bbox': [100, 150, 180, 210], 'confidence': 0.95,
+                 'class': 'front-bumper-dent', 'severity': 'moderate',
+                 'estimated_cost': 300}]
+        
+        # ?format= value -> file signature check
+        signatures = {
+            'jpeg': lambda b: b[:2] == b'\xff\xd8',
+            'webp': lambda b: b[:4] == b'RIFF' and b[8:12] == b'WEBP'
+        }
+        for fmt, check in signatures.items():
+            image = api._load_image(create_test_jpeg())
+            data = base64.b64decode(api._annotate(image, dets, output_format=fmt))
+            if not check(data):
+                print_error(f"format={fmt} did not produce {api.OUTPUT_FORMATS[fmt]}")
+                return False
+            print_success(f"format={fmt} -> {api.OUTPUT_FORMATS[fmt]} ({len(data)} bytes)")
+        
+        return True
+        
+    except Exception as e:
+        print_error(f"Annotated format test failed: {e}")
+        return False
+
+
 def run_all_tests():
     """Run complete test suite"""
     print("=" * 60)
@@ -315,6 +531,12 @@ def run_all_tests():
     results.append(("Cost Estimation", test_cost_estimation()))
     results.append(("Damage Classes", test_damage_classes()))
     
+    # Test 9-12: Offline behaviour
+    results.append(("Comparison Counting", test_compare_detections(detector)))
+    results.append(("Inference Cache", test_inference_cache(detector)))
+    results.append(("Upload Size Limit", test_upload_limit()))
+    results.append(("Annotated Image Formats", test_annotated_formats()))
+    
     # Summary
     print("\n" + "=" * 60)
     print("📊 Test Summary")
@@ -351,5 +573,4 @@ if __name__ == "__main__":
         print("\n\n⚠️  Tests interrupted by user")
     except Exception as e:
         print_error(f"\n❌ Test suite error: {e}")
-        import traceback
         traceback.print_exc()
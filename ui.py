@@ -4,55 +4,105 @@ User-friendly interface for vehicle inspection
 """
 
 import gradio as gr
-import json
+import orjson
+import traceback
 from datetime import datetime
-from PIL import Image
+import numpy as np
+from PIL import Image, ImageOps, ExifTags
 
-from detector import DamageDetector
+from detector import get_detector
 from config import (
-    ROBOFLOW_API_KEY,
-    ROBOFLOW_MODEL_ID,
     HOST,
     PORT,
     APP_TITLE,
     APP_DESCRIPTION
 )
 
-# Initialize detector
-detector = DamageDetector(
-    api_key=ROBOFLOW_API_KEY,
-    model_id=ROBOFLOW_MODEL_ID
-)
+# Longest image side sent for detection; larger uploads are downscaled
+MAX_IMAGE_SIDE = 1280
+
+# Columnar (structure-of-arrays) layout for aggregating detections
+_DETECTION_DTYPE = np.dtype([
+    ('cost', 'i4'),
+    ('sev', 'U8'),
+    ('conf', 'f8'),
+    ('x', 'i4'),
+    ('y', 'i4'),
+    ('cls', 'O')
+])
 
 
-def analyze_single_image(image):
-    """Analyze a single vehicle image for damages"""
+def _prepare_image(image):
+    """
+    Return an RGB image with its longest side capped at MAX_IMAGE_SIDE
     
-    if image is None:
+    The caller's image is never modified: it is returned as-is when already
+    RGB and small enough, otherwise a converted or copied image is resized.
+    """
+    if max(image.size) <= MAX_IMAGE_SIDE:
+        return image if image.mode == 'RGB' else image.convert('RGB')
+    
+    img = image.convert('RGB') if image.mode != 'RGB' else image.copy()
+    img.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.BILINEAR)
+    return img
+
+
+def analyze_single_image(image_path):
+    """Analyze a single vehicle image (uploaded file path) for damages"""
+    
+    if image_path is None:
         return None, "⚠️ Please upload an image!", ""
     
     try:
-        # Convert to PIL Image
-        img = Image.fromarray(image).convert('RGB')
+        detector = get_detector()
+        
+        # Gradio hands over the uploaded file; decode it once and cap its size
+        image = Image.open(image_path)
+        image.load()
+        
+        # Apply the EXIF orientation (e.g. rotated phone photos) to the pixels
+        orientation = image.getexif().get(ExifTags.Base.Orientation, 1)
+        if orientation != 1:
+            ImageOps.exif_transpose(image, in_place=True)
+        img = _prepare_image(image)
+        
+        # Upright JPEG files used as-is are forwarded without re-encoding
+        raw_jpeg_bytes = None
+        if img is image and image.format == 'JPEG' and orientation == 1:
+            with open(image_path, 'rb') as f:
+                raw_jpeg_bytes = f.read()
         
         # Detect damages
-        detections = detector.detect_damages(img)
+        detections = detector.detect_damages(img, raw_jpeg_bytes)
         
         # Draw annotations
         annotated_img = detector.draw_detections(img, detections)
         
+        # Pack detections into columns once for statistics, table and JSON
+        arr = np.array(
+            [(d['estimated_cost'], d['severity'], d['confidence'],
+              d['bbox'][0], d['bbox'][1], d['class']) for d in detections],
+            dtype=_DETECTION_DTYPE
+        )
+        
         # Calculate statistics
-        total_cost = sum(d['estimated_cost'] for d in detections)
-        severity_counts = {
-            'minor': sum(1 for d in detections if d['severity'] == 'minor'),
-            'moderate': sum(1 for d in detections if d['severity'] == 'moderate'),
-            'severe': sum(1 for d in detections if d['severity'] == 'severe')
-        }
+        total_cost = int(arr['cost'].sum())
+        severity_counts = {'minor': 0, 'moderate': 0, 'severe': 0}
+        uniq, cnt = np.unique(arr['sev'], return_counts=True)
+        severity_counts.update(zip(uniq.tolist(), cnt.tolist()))
+        
+        # Row tuples (cost, sev, conf, x, y, cls) shared by the table and JSON
+        rows = arr.tolist()
+        
+        # One clock read for both the report header and the JSON timestamp
+        now = datetime.now()
+        ts_human = now.strftime('%Y-%m-%d %H:%M:%S')
+        ts_iso = now.isoformat()
         
         # Generate report
-        report_md = f"""
+        parts = [f"""
 # 🚗 Vehicle Damage Analysis Report
-**Date:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+**Date:** {ts_human}
 
 ---
 
@@ -64,46 +114,43 @@ def analyze_single_image(image):
 - **Minor:** {severity_counts['minor']} | **Moderate:** {severity_counts['moderate']} | **Severe:** {severity_counts['severe']}
 - **Estimated Repair Cost:** **${total_cost}**
 
-"""
+"""]
         
         if detections:
-            report_md += "## Detailed Damage List\n\n"
-            report_md += "| # | Type | Severity | Confidence | Location | Cost |\n"
-            report_md += "|---|------|----------|------------|----------|------|\n"
-            for i, det in enumerate(detections, 1):
-                x1, y1 = det['bbox'][:2]
-                report_md += (
-                    f"| {i} | {det['class']} | {det['severity']} | "
-                    f"{det['confidence']*100:.1f}% | ({x1}, {y1}) | "
-                    f"${det['estimated_cost']} |\n"
+            parts.append("## Detailed Damage List\n\n")
+            parts.append("| # | Type | Severity | Confidence | Location | Cost |\n")
+            parts.append("|---|------|----------|------------|----------|------|\n")
+            for i, (cost, sev, conf, x, y, cls) in enumerate(rows, 1):
+                parts.append(
+                    f"| {i} | {cls} | {sev} | {conf*100:.1f}% | ({x}, {y}) | ${cost} |\n"
                 )
         
-        report_md += "\n---\n*Powered by Roboflow AI Detection*"
+        parts.append("\n---\n*Powered by Roboflow AI Detection*")
+        report_md = "".join(parts)
         
         # JSON output as string
         json_data = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': ts_iso,
             'total_damages': len(detections),
             'estimated_cost': total_cost,
             'severity_breakdown': severity_counts,
             'damages': []
         }
         
-        for d in detections:
+        for cost, sev, conf, x, y, cls in rows:
             json_data['damages'].append({
-                'class': str(d['class']),
-                'severity': str(d['severity']),
-                'confidence': float(round(d['confidence']*100, 1)),
-                'location': {'x': int(d['bbox'][0]), 'y': int(d['bbox'][1])},
-                'estimated_cost': int(d['estimated_cost'])
+                'class': cls,
+                'severity': sev,
+                'confidence': round(conf*100, 1),
+                'location': {'x': x, 'y': y},
+                'estimated_cost': cost
             })
         
-        json_output = json.dumps(json_data, indent=2)
+        json_output = orjson.dumps(json_data, option=orjson.OPT_INDENT_2).decode()
         
         return annotated_img, report_md, json_output
     
     except Exception as e:
-        import traceback
         error_msg = f"❌ **Error:** {str(e)}\n\n```\n{traceback.format_exc()}\n```"
         return None, error_msg, ""
 
@@ -115,18 +162,22 @@ def compare_images_fn(pickup_image, return_image):
         return None, "⚠️ Please upload both pickup and return images!", ""
     
     try:
-        # Convert to PIL Images
-        pickup_img = Image.fromarray(pickup_image).convert('RGB')
-        return_img = Image.fromarray(return_image).convert('RGB')
+        detector = get_detector()
+        
+        # Gradio hands over PIL Images; cap their size before detection
+        pickup_img = _prepare_image(pickup_image)
+        return_img = _prepare_image(return_image)
         
-        # Compare images
-        comparison = detector.compare_images(pickup_img, return_img)
+        # Detect both images, then compare
+        pickup_dets, return_dets = detector.detect_damages_batch([pickup_img, return_img])
+        
+        comparison = detector.compare_detections(pickup_dets, return_dets)
         
         # Draw annotations
-        pickup_annotated = detector.draw_detections(
+        pickup_annotated = detector.draw_detections_uniform(
             pickup_img,
             comparison['pickup_damages'],
-            {'minor': 'green', 'moderate': 'green', 'severe': 'green'}
+            'green'
         )
         
         return_annotated = detector.draw_detections(
@@ -134,22 +185,27 @@ def compare_images_fn(pickup_image, return_image):
             comparison['new_damages']
         )
         
-        # Create side-by-side comparison
-        w1, h1 = pickup_annotated.size
-        w2, h2 = return_annotated.size
-        max_h = max(h1, h2)
+        # Create side-by-side comparison, padding the shorter image with white
+        pa = np.asarray(pickup_annotated)
+        ra = np.asarray(return_annotated)
+        max_h = max(pa.shape[0], ra.shape[0])
+        pa = np.pad(pa, ((0, max_h - pa.shape[0]), (0, 0), (0, 0)), constant_values=255)
+        ra = np.pad(ra, ((0, max_h - ra.shape[0]), (0, 0), (0, 0)), constant_values=255)
         
-        combined = Image.new('RGB', (w1 + w2, max_h), color='white')
-        combined.paste(pickup_annotated, (0, 0))
-        combined.paste(return_annotated, (w1, 0))
+        combined = Image.fromarray(np.hstack([pa, ra]))
         
         # Generate report
         new_cost = comparison['total_new_cost']
         new_damages = comparison['new_damages']
         
-        report_md = f"""
+        # One clock read for both the report header and the JSON timestamp
+        now = datetime.now()
+        ts_human = now.strftime('%Y-%m-%d %H:%M:%S')
+        ts_iso = now.isoformat()
+        
+        parts = [f"""
 # 🔄 Vehicle Comparison Report
-**Date:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+**Date:** {ts_human}
 
 ---
 
@@ -161,23 +217,11 @@ def compare_images_fn(pickup_image, return_image):
 
 {comparison['summary']}
 
-"""
-        
-        if new_damages:
-            report_md += "## New Damages Detected\n\n"
-            report_md += "| # | Type | Severity | Confidence | Cost |\n"
-            report_md += "|---|------|----------|------------|------|\n"
-            for i, det in enumerate(new_damages, 1):
-                report_md += (
-                    f"| {i} | {det['class']} | {det['severity']} | "
-                    f"{det['confidence']*100:.1f}% | ${det['estimated_cost']} |\n"
-                )
-        
-        report_md += "\n---\n*Green boxes = Existing | Red/Orange/Yellow = New damages*"
+"""]
         
         # JSON output as string
         json_data = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': ts_iso,
             'pickup_damages': len(comparison['pickup_damages']),
             'return_damages': len(comparison['return_damages']),
             'new_damages': len(new_damages),
@@ -185,20 +229,32 @@ def compare_images_fn(pickup_image, return_image):
             'new_damage_details': []
         }
         
-        for d in new_damages:
+        # Build the report table and JSON details in one pass
+        if new_damages:
+            parts.append("## New Damages Detected\n\n")
+            parts.append("| # | Type | Severity | Confidence | Cost |\n")
+            parts.append("|---|------|----------|------------|------|\n")
+        for i, det in enumerate(new_damages, 1):
+            cls = det['class']
+            sev = det['severity']
+            conf = det['confidence'] * 100
+            cost = det['estimated_cost']
+            parts.append(f"| {i} | {cls} | {sev} | {conf:.1f}% | ${cost} |\n")
             json_data['new_damage_details'].append({
-                'class': str(d['class']),
-                'severity': str(d['severity']),
-                'confidence': float(round(d['confidence']*100, 1)),
-                'estimated_cost': int(d['estimated_cost'])
+                'class': cls,
+                'severity': sev,
+                'confidence': round(conf, 1),
+                'estimated_cost': cost
             })
         
-        json_output = json.dumps(json_data, indent=2)
+        parts.append("\n---\n*Green boxes = Existing | Red/Orange/Yellow = New damages*")
+        report_md = "".join(parts)
+        
+        json_output = orjson.dumps(json_data, option=orjson.OPT_INDENT_2).decode()
         
         return combined, report_md, json_output
     
     except Exception as e:
-        import traceback
         error_msg = f"❌ **Error:** {str(e)}\n\n```\n{traceback.format_exc()}\n```"
         return None, error_msg, ""
 
@@ -228,7 +284,7 @@ with gr.Blocks(title=APP_TITLE, theme=gr.themes.Soft()) as demo:
                 with gr.Column():
                     single_input = gr.Image(
                         label="📸 Upload Vehicle Image",
-                        type="numpy",
+                        type="filepath",
                         sources=["upload", "webcam", "clipboard"]
                     )
                     analyze_btn = gr.Button(
@@ -245,7 +301,7 @@ with gr.Blocks(title=APP_TITLE, theme=gr.themes.Soft()) as demo:
             single_output_report = gr.Markdown(label="📊 Analysis Report")
             
             with gr.Accordion("📋 JSON Output (for API integration)", open=False):
-                single_output_json = gr.Textbox(label="JSON Data", lines=10, max_lines=20)
+                single_output_json = gr.Code(label="JSON Data", language="json")
             
             analyze_btn.click(
                 fn=analyze_single_image,
@@ -265,14 +321,14 @@ with gr.Blocks(title=APP_TITLE, theme=gr.themes.Soft()) as demo:
                 with gr.Column():
                     pickup_input = gr.Image(
                         label="📸 Pickup Photo (Before Rental)",
-                        type="numpy",
+                        type="pil",
                         sources=["upload", "webcam", "clipboard"]
                     )
                 
                 with gr.Column():
                     return_input = gr.Image(
                         label="📸 Return Photo (After Rental)",
-                        type="numpy",
+                        type="pil",
                         sources=["upload", "webcam", "clipboard"]
                     )
             
@@ -289,7 +345,7 @@ with gr.Blocks(title=APP_TITLE, theme=gr.themes.Soft()) as demo:
             compare_output_report = gr.Markdown(label="📊 Comparison Report")
             
             with gr.Accordion("📋 JSON Output (for API integration)", open=False):
-                compare_output_json = gr.Textbox(label="JSON Data", lines=10, max_lines=20)
+                compare_output_json = gr.Code(label="JSON Data", language="json")
             
             compare_btn.click(
                 fn=compare_images_fn,